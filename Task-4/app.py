@@ -4,14 +4,14 @@ A Streamlit application for summarizing PDFs and generating interactive quizzes.
 """
 
 import streamlit as st
-import json
-import os
-from dotenv import load_dotenv
-from utils.pdf_extractor import PDFExtractor
-from utils.agent import generate_summary_sync, generate_quiz_sync
+import copy
+import hashlib
+import itertools
+import orjson
+from utils.pdf_extractor import PDFExtractor, count_words
 
-# Load environment variables
-load_dotenv()
+# utils.agent (and the Agents SDK/openai stack behind it) is imported lazily
+# where generation happens, so quiz-taking reruns never pay for it
 
 # =============================================================================
 # Page Configuration
@@ -28,24 +28,33 @@ st.set_page_config(
 # Session State Initialization
 # =============================================================================
 
+# Per-document session state and its empty values; restored in bulk on a new upload
+RESET_DEFAULTS = {
+    'pdf_text': None,
+    'pdf_metadata': {},
+    'summary': None,
+    'summary_data': {},
+    'quiz': None,
+    'quiz_json': None,
+    'quiz_error': None,
+    'user_answers': {},
+    'quiz_submitted': False,
+    'quiz_score': None,
+    'results_text': None,
+    'pdf_hash': None,
+    'last_file_id': None,
+    'quiz_round': 0,
+}
+
+# Keys owned by the app (as opposed to Streamlit widgets)
+APP_KEYS = tuple(RESET_DEFAULTS)
+
+
 def initialize_session_state():
     """Initialize all session state variables."""
-    if 'pdf_text' not in st.session_state:
-        st.session_state.pdf_text = None
-    if 'pdf_metadata' not in st.session_state:
-        st.session_state.pdf_metadata = {}
-    if 'summary' not in st.session_state:
-        st.session_state.summary = None
-    if 'summary_data' not in st.session_state:
-        st.session_state.summary_data = {}
-    if 'quiz' not in st.session_state:
-        st.session_state.quiz = None
-    if 'user_answers' not in st.session_state:
-        st.session_state.user_answers = {}
-    if 'quiz_submitted' not in st.session_state:
-        st.session_state.quiz_submitted = False
-    if 'quiz_score' not in st.session_state:
-        st.session_state.quiz_score = None
+    for key, value in RESET_DEFAULTS.items():
+        if key not in st.session_state:
+            st.session_state[key] = copy.deepcopy(value)
 
 initialize_session_state()
 
@@ -54,44 +63,46 @@ initialize_session_state()
 # =============================================================================
 
 def reset_session():
-    """Clear all session state and start over."""
-    for key in list(st.session_state.keys()):
-        del st.session_state[key]
+    """Clear all app session state and start over (widget-managed keys are left alone)."""
+    for key in APP_KEYS:
+        st.session_state.pop(key, None)
     initialize_session_state()
     st.rerun()
 
 
+# Question types graded by exact match
+MCQ_TF = frozenset({'mcq', 'true_false'})
+
+
+def _is_correct(question, user_answer):
+    """Check a single answer against its question."""
+    # For MCQ and True/False, exact match
+    if question['type'] in MCQ_TF:
+        return user_answer == question['correct_answer']
+    # For short answer, we'll mark as correct if answered (simplified)
+    # In production, you'd want more sophisticated evaluation
+    return bool(user_answer.strip())
+
+
 def calculate_score(quiz_questions, user_answers):
     """Calculate quiz score based on user answers."""
     if not quiz_questions or not user_answers:
         return None
 
-    correct = 0
     total = len(quiz_questions)
-    results = []
+    answers = [user_answers.get(i, '') for i in range(total)]
 
-    for i, question in enumerate(quiz_questions):
-        user_answer = user_answers.get(i, '')
-        correct_answer = question['correct_answer']
-
-        # For MCQ and True/False, exact match
-        if question['type'] in ['mcq', 'true_false']:
-            is_correct = user_answer == correct_answer
-        else:
-            # For short answer, we'll mark as correct if answered (simplified)
-            # In production, you'd want more sophisticated evaluation
-            is_correct = bool(user_answer.strip())
-
-        if is_correct:
-            correct += 1
-
-        results.append({
+    results = [
+        {
             'question_num': i + 1,
-            'correct': is_correct,
-            'user_answer': user_answer,
-            'correct_answer': correct_answer,
+            'correct': _is_correct(question, answer),
+            'user_answer': answer,
+            'correct_answer': question['correct_answer'],
             'explanation': question.get('explanation', '')
-        })
+        }
+        for i, (question, answer) in enumerate(zip(quiz_questions, answers))
+    ]
+    correct = sum(result['correct'] for result in results)
 
     score_percentage = (correct / total) * 100
 
@@ -103,6 +114,100 @@ def calculate_score(quiz_questions, user_answers):
     }
 
 
+class GenerationFailed(Exception):
+    """Raised from cached generators so failed LLM results are not cached."""
+
+    def __init__(self, result):
+        super().__init__(result.get('error'))
+        self.result = result
+
+
+@st.cache_data(show_spinner=False, max_entries=32, persist="disk")
+def cached_extract_text(pdf_hash, _pdf_buffer):
+    """Extract and truncate PDF text, cached on the file's content digest."""
+    extraction_result = PDFExtractor.extract_text(_pdf_buffer)
+    if extraction_result['success']:
+        extraction_result['truncation'] = PDFExtractor.truncate_text(extraction_result['text'])
+    return extraction_result
+
+
+SUMMARY_STORE_MAX_ENTRIES = 32
+
+
+@st.cache_resource
+def summary_store():
+    """
+    Completed streamed summaries keyed on (file digest, length, format).
+
+    Streaming output can't go through st.cache_data, so finished summaries
+    are kept here instead (oldest entries are evicted first).
+    """
+    return {}
+
+
+def remember_summary(key, summary_data):
+    """Store a finished summary, evicting the oldest entry when full."""
+    store = summary_store()
+    store[key] = summary_data
+    while len(store) > SUMMARY_STORE_MAX_ENTRIES:
+        store.pop(next(iter(store)))
+
+
+@st.cache_data(show_spinner=False, max_entries=32, persist="disk")
+def cached_summary_and_quiz(pdf_hash, _text, length, format_type, num_questions, types_tuple, difficulty):
+    """Generate summary and quiz together, cached on the union of both keys."""
+    from utils.agent import generate_summary_and_quiz_sync
+
+    result = generate_summary_and_quiz_sync(
+        text=_text,
+        length=length,
+        format_type=format_type,
+        num_questions=num_questions,
+        question_types=list(types_tuple),
+        difficulty=difficulty
+    )
+    if not (result['summary']['success'] and result['quiz']['success']):
+        raise GenerationFailed(result)
+    return result
+
+
+def build_results_text(score, quiz_questions):
+    """Build the plain-text results download for a scored quiz."""
+    rule = '=' * 50
+    parts = [f"""Quiz Results
+{rule}
+Score: {score['correct']}/{score['total']} ({score['percentage']:.1f}%)
+{get_feedback_message(score['percentage'])}
+
+{rule}
+Detailed Results:
+{rule}
+
+"""]
+    parts.extend(
+        f"""
+Question {result['question_num']}: {'✓' if result['correct'] else '✗'}
+{quiz_questions[result['question_num'] - 1]['question']}
+Your Answer: {result['user_answer']}
+Correct Answer: {result['correct_answer']}
+Explanation: {result['explanation']}
+
+{'-'*50}
+"""
+        for result in score['results']
+    )
+    return "".join(parts)
+
+
+def store_quiz(questions):
+    """Store a freshly generated quiz and serialize its download once."""
+    st.session_state.quiz = questions
+    st.session_state.quiz_json = orjson.dumps(questions, option=orjson.OPT_INDENT_2)
+    st.session_state.quiz_error = None
+    st.session_state.quiz_submitted = False
+    st.session_state.user_answers = {}
+
+
 def get_feedback_message(percentage):
     """Get encouraging feedback based on score percentage."""
     if percentage >= 90:
@@ -117,6 +222,133 @@ def get_feedback_message(percentage):
         return "💪 Don't give up, try again!"
 
 
+@st.fragment
+def quiz_fragment():
+    """
+    Quiz questions and results.
+
+    Runs as a fragment so submitting answers only reruns this section, not the
+    PDF details, summary and sidebar.
+    """
+    if not st.session_state.quiz_submitted:
+        st.info("📝 Answer the questions below and click 'Submit Quiz' when done.")
+
+        # Display questions in a form so answering doesn't rerun the script
+        with st.form("quiz_form"):
+            for i, question in enumerate(st.session_state.quiz):
+                with st.container():
+                    st.markdown(f"**Question {i+1}:** {question['question']}")
+
+                    if question['type'] == 'mcq':
+                        st.radio(
+                            "Select your answer:",
+                            options=question['options'],
+                            key=f"q_{i}",
+                            index=None
+                        )
+
+                    elif question['type'] == 'true_false':
+                        st.radio(
+                            "Select your answer:",
+                            options=['True', 'False'],
+                            key=f"q_{i}",
+                            index=None
+                        )
+
+                    elif question['type'] == 'short_answer':
+                        st.text_area(
+                            "Your answer:",
+                            key=f"q_{i}",
+                            height=100
+                        )
+
+                    st.markdown("---")
+
+            # Submit button
+            submitted = st.form_submit_button(
+                "✅ Submit Quiz", type="primary", use_container_width=True
+            )
+
+        if submitted:
+            # Collect all answers in one pass
+            st.session_state.user_answers = {
+                i: answer
+                for i in range(len(st.session_state.quiz))
+                if (answer := st.session_state.get(f"q_{i}"))
+            }
+
+            if len(st.session_state.user_answers) < len(st.session_state.quiz):
+                st.warning("⚠️ Please answer all questions before submitting.")
+            else:
+                st.session_state.quiz_score = calculate_score(
+                    st.session_state.quiz,
+                    st.session_state.user_answers
+                )
+                st.session_state.results_text = build_results_text(
+                    st.session_state.quiz_score,
+                    st.session_state.quiz
+                )
+                st.session_state.quiz_submitted = True
+                # Only the quiz changes, so only rerun this fragment
+                st.rerun(scope="fragment")
+
+        # Download quiz as JSON (download buttons can't live inside a form)
+        st.download_button(
+            label="⬇️ Download Quiz",
+            data=st.session_state.quiz_json,
+            file_name=f"{st.session_state.pdf_metadata['filename']}_quiz.json",
+            mime="application/json"
+        )
+
+    else:
+        # Display results
+        score = st.session_state.quiz_score
+        feedback = get_feedback_message(score['percentage'])
+
+        st.success(f"""
+        ### {feedback}
+        **Score: {score['correct']}/{score['total']} ({score['percentage']:.1f}%)**
+        """)
+
+        # Display detailed results
+        st.subheader("📊 Detailed Results")
+
+        for result in score['results']:
+            with st.expander(
+                f"Question {result['question_num']}: "
+                f"{'✅ Correct' if result['correct'] else '❌ Incorrect'}"
+            ):
+                question = st.session_state.quiz[result['question_num'] - 1]
+                st.markdown(f"**Question:** {question['question']}")
+                st.markdown(f"**Your Answer:** {result['user_answer']}")
+
+                if not result['correct']:
+                    st.markdown(f"**Correct Answer:** {result['correct_answer']}")
+
+                st.info(f"**Explanation:** {result['explanation']}")
+
+        # Action buttons
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🔄 Generate New Quiz", use_container_width=True):
+                st.session_state.quiz = None
+                st.session_state.quiz_json = None
+                st.session_state.quiz_round += 1
+                st.session_state.user_answers = {}
+                st.session_state.quiz_submitted = False
+                st.session_state.quiz_score = None
+                st.session_state.results_text = None
+                st.rerun()
+        with col2:
+            # Download results
+            st.download_button(
+                label="⬇️ Download Results",
+                data=st.session_state.results_text,
+                file_name=f"{st.session_state.pdf_metadata['filename']}_results.txt",
+                mime="text/plain"
+            )
+
+
 # =============================================================================
 # Sidebar
 # =============================================================================
@@ -202,44 +434,53 @@ st.markdown("Upload a PDF document to generate summaries and interactive quizzes
 # Step 1: PDF Upload and Text Extraction
 # =============================================================================
 
-if uploaded_file is not None:
-    # Check if this is a new file
-    if st.session_state.pdf_text is None or st.session_state.pdf_metadata.get('filename') != uploaded_file.name:
-
-        # Clear all previous data when new file is uploaded
-        st.session_state.pdf_text = None
-        st.session_state.pdf_metadata = {}
-        st.session_state.summary = None
-        st.session_state.summary_data = {}
-        st.session_state.quiz = None
-        st.session_state.user_answers = {}
-        st.session_state.quiz_submitted = False
-        st.session_state.quiz_score = None
-
-        with st.spinner("📖 Extracting text from PDF..."):
-            # Read file data
-            file_data = uploaded_file.read()
-
-            # Validate PDF
-            validation = PDFExtractor.validate_pdf(file_data, uploaded_file.name)
-
-            if not validation['valid']:
-                st.error(f"❌ {validation['error']}")
-            else:
-                # Extract text
-                extraction_result = PDFExtractor.extract_text(file_data)
+# file_id is stable for a given upload, so reruns caused by other widgets skip this block
+if uploaded_file is not None and uploaded_file.file_id != st.session_state.last_file_id:
+    # Validate while copying the upload, so oversized files are rejected before being read
+    uploaded_file.seek(0)
+    validation = PDFExtractor.validate_pdf_stream(uploaded_file, uploaded_file.name, size_hint=uploaded_file.size)
+
+    if not validation['valid']:
+        # Clear all previous data when an invalid file is uploaded
+        st.session_state.update(copy.deepcopy(RESET_DEFAULTS))
+        st.error(f"❌ {validation['error']}")
+
+    else:
+        # The validator and extractor share this buffer
+        pdf_buffer = validation['buffer']
+
+        # Identify the upload by content so the same PDF is never extracted twice
+        with pdf_buffer.getbuffer() as file_data:
+            file_hash = hashlib.blake2b(file_data, digest_size=16).hexdigest()
+
+        if file_hash == st.session_state.pdf_hash:
+            # Same PDF uploaded again: keep the current results
+            st.session_state.last_file_id = uploaded_file.file_id
+            st.session_state.pdf_metadata['filename'] = uploaded_file.name
+
+        # Check if this is a new file
+        else:
+
+            # Clear all previous data when new file is uploaded (fresh copies of the mutable defaults)
+            st.session_state.update(copy.deepcopy(RESET_DEFAULTS))
+
+            with st.spinner("📖 Extracting text from PDF..."):
+                # Extract text (cached on the file contents)
+                extraction_result = cached_extract_text(file_hash, pdf_buffer)
 
                 if extraction_result['success']:
                     # Store in session state
                     st.session_state.pdf_text = extraction_result['text']
+                    st.session_state.pdf_hash = file_hash
+                    st.session_state.last_file_id = uploaded_file.file_id
                     st.session_state.pdf_metadata = {
                         'filename': uploaded_file.name,
                         'page_count': extraction_result['page_count'],
                         'word_count': extraction_result['word_count']
                     }
 
-                    # Check for truncation
-                    truncation_result = PDFExtractor.truncate_text(extraction_result['text'])
+                    # Check for truncation (already done, and cached, with the extraction)
+                    truncation_result = extraction_result['truncation']
                     if truncation_result['truncated']:
                         st.session_state.pdf_text = truncation_result['text']
                         st.warning("⚠️ Document was truncated due to length. Processing partial content.")
@@ -270,25 +511,103 @@ if st.session_state.pdf_text:
     st.subheader("📝 Document Summary")
 
     if st.session_state.summary is None:
-        if st.button("✨ Generate Summary", type="primary", use_container_width=True):
-            with st.spinner("🤖 Generating summary..."):
-                summary_result = generate_summary_sync(
-                    text=st.session_state.pdf_text,
-                    length=summary_length,
-                    format_type=summary_format
-                )
+        col1, col2 = st.columns(2)
+        with col1:
+            generate_summary_clicked = st.button(
+                "✨ Generate Summary", type="primary", use_container_width=True
+            )
+        with col2:
+            generate_both_clicked = st.button(
+                "✨ Generate Summary + Quiz", use_container_width=True
+            )
+
+        if generate_summary_clicked:
+            summary_key = (st.session_state.pdf_hash, summary_length, summary_format)
+            summary_result = summary_store().get(summary_key)
+
+            if summary_result is None:
+                # Render tokens as they arrive instead of waiting for the full summary
+                try:
+                    from utils.agent import stream_summary_sync
+
+                    summary_chunks = stream_summary_sync(
+                        text=st.session_state.pdf_text,
+                        length=summary_length,
+                        format_type=summary_format
+                    )
+                    # Long documents are summarized section by section before the
+                    # first token, so keep the spinner up until something arrives
+                    with st.spinner("🤖 Generating summary..."):
+                        first_chunk = next(summary_chunks, "")
+                    summary_text = st.write_stream(itertools.chain([first_chunk], summary_chunks))
+                    if not summary_text:
+                        raise ValueError("The model returned an empty summary")
+                    summary_result = {
+                        'success': True,
+                        'summary': summary_text,
+                        'word_count': count_words(summary_text),
+                        # Only the structured (Summary + Quiz) path returns key topics
+                        'key_topics': [],
+                        'error': None
+                    }
+                    remember_summary(summary_key, summary_result)
+                except Exception as e:
+                    summary_result = {
+                        'success': False,
+                        'summary': '',
+                        'word_count': 0,
+                        'key_topics': [],
+                        'error': f'Failed to generate summary: {str(e)}'
+                    }
 
-                if summary_result['success']:
-                    st.session_state.summary = summary_result['summary']
-                    st.session_state.summary_data = summary_result
-                    st.rerun()
-                else:
-                    st.error(f"❌ {summary_result['error']}")
+            if summary_result['success']:
+                st.session_state.summary = summary_result['summary']
+                st.session_state.summary_data = summary_result
+                st.rerun()
+            else:
+                st.error(f"❌ {summary_result['error']}")
+
+        elif generate_both_clicked:
+            if not question_types:
+                st.warning("⚠️ Please select at least one question type.")
+            else:
+                with st.spinner("🤖 Generating summary and quiz..."):
+                    try:
+                        combined_result = cached_summary_and_quiz(
+                            st.session_state.pdf_hash,
+                            st.session_state.pdf_text,
+                            summary_length,
+                            summary_format,
+                            num_questions,
+                            tuple(question_types),
+                            difficulty
+                        )
+                    except GenerationFailed as e:
+                        combined_result = e.result
+                    summary_result = combined_result['summary']
+                    quiz_result = combined_result['quiz']
+
+                    if summary_result['success']:
+                        st.session_state.summary = summary_result['summary']
+                        st.session_state.summary_data = summary_result
+
+                        # The quiz section is only shown once a summary exists,
+                        # so a quiz failure is kept and reported there after the rerun
+                        if quiz_result['success']:
+                            store_quiz(quiz_result['questions'])
+                        else:
+                            st.session_state.quiz_error = quiz_result['error']
+                        st.rerun()
+                    else:
+                        st.error(f"❌ {summary_result['error']}")
     else:
         # Display summary
         with st.expander("📋 View Summary", expanded=True):
             st.markdown(st.session_state.summary)
 
+            if st.session_state.summary_data.get('key_topics'):
+                st.markdown("**Key Topics:** " + ", ".join(st.session_state.summary_data['key_topics']))
+
             col1, col2 = st.columns(2)
             with col1:
                 st.caption(f"Summary Word Count: {st.session_state.summary_data['word_count']}")
@@ -309,155 +628,58 @@ if st.session_state.pdf_text:
         st.subheader("📊 Interactive Quiz")
 
         if st.session_state.quiz is None:
-            if st.button("🎯 Generate Quiz", type="primary", use_container_width=True):
+            generate_quiz_clicked = st.button("🎯 Generate Quiz", type="primary", use_container_width=True)
+
+            # Quiz half of a combined generation that failed (cleared by trying again)
+            if generate_quiz_clicked:
+                st.session_state.quiz_error = None
+            elif st.session_state.quiz_error:
+                st.error(f"❌ {st.session_state.quiz_error}")
+
+            if generate_quiz_clicked:
                 if not question_types:
                     st.warning("⚠️ Please select at least one question type.")
                 else:
-                    with st.spinner("🤖 Creating quiz questions..."):
-                        quiz_result = generate_quiz_sync(
+                    progress = st.progress(0.0, text="🤖 Creating quiz questions...")
+                    questions = {}
+                    try:
+                        from utils.agent import stream_quiz_sync
+
+                        # Questions arrive as each one finishes; show progress meanwhile
+                        # ("Generate New Quiz" bumps quiz_round to skip the cached quiz)
+                        for position, question in stream_quiz_sync(
                             text=st.session_state.pdf_text,
                             num_questions=num_questions,
                             question_types=question_types,
-                            difficulty=difficulty
-                        )
-
-                        if quiz_result['success']:
-                            st.session_state.quiz = quiz_result['questions']
-                            st.session_state.quiz_submitted = False
-                            st.session_state.user_answers = {}
-                            st.rerun()
-                        else:
-                            st.error(f"❌ {quiz_result['error']}")
-        else:
-            # Display quiz
-            if not st.session_state.quiz_submitted:
-                st.info("📝 Answer the questions below and click 'Submit Quiz' when done.")
-
-                # Display questions
-                for i, question in enumerate(st.session_state.quiz):
-                    with st.container():
-                        st.markdown(f"**Question {i+1}:** {question['question']}")
-
-                        if question['type'] == 'mcq':
-                            answer = st.radio(
-                                "Select your answer:",
-                                options=question['options'],
-                                key=f"q_{i}",
-                                index=None
-                            )
-                            if answer:
-                                st.session_state.user_answers[i] = answer
-
-                        elif question['type'] == 'true_false':
-                            answer = st.radio(
-                                "Select your answer:",
-                                options=['True', 'False'],
-                                key=f"q_{i}",
-                                index=None
-                            )
-                            if answer:
-                                st.session_state.user_answers[i] = answer
-
-                        elif question['type'] == 'short_answer':
-                            answer = st.text_area(
-                                "Your answer:",
-                                key=f"q_{i}",
-                                height=100
-                            )
-                            if answer:
-                                st.session_state.user_answers[i] = answer
-
-                        st.markdown("---")
-
-                # Submit button
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("✅ Submit Quiz", type="primary", use_container_width=True):
-                        if len(st.session_state.user_answers) < len(st.session_state.quiz):
-                            st.warning("⚠️ Please answer all questions before submitting.")
-                        else:
-                            st.session_state.quiz_score = calculate_score(
-                                st.session_state.quiz,
-                                st.session_state.user_answers
+                            difficulty=difficulty,
+                            refresh=st.session_state.quiz_round > 0
+                        ):
+                            questions[position] = question
+                            progress.progress(
+                                len(questions) / num_questions,
+                                text=f"🤖 Created {len(questions)} of {num_questions} questions..."
                             )
-                            st.session_state.quiz_submitted = True
-                            st.rerun()
-                with col2:
-                    # Download quiz as JSON
-                    quiz_json = json.dumps(st.session_state.quiz, indent=2)
-                    st.download_button(
-                        label="⬇️ Download Quiz",
-                        data=quiz_json,
-                        file_name=f"{st.session_state.pdf_metadata['filename']}_quiz.json",
-                        mime="application/json"
-                    )
-
-            else:
-                # Display results
-                score = st.session_state.quiz_score
-                feedback = get_feedback_message(score['percentage'])
-
-                st.success(f"""
-                ### {feedback}
-                **Score: {score['correct']}/{score['total']} ({score['percentage']:.1f}%)**
-                """)
-
-                # Display detailed results
-                st.subheader("📊 Detailed Results")
-
-                for result in score['results']:
-                    with st.expander(
-                        f"Question {result['question_num']}: "
-                        f"{'✅ Correct' if result['correct'] else '❌ Incorrect'}"
-                    ):
-                        question = st.session_state.quiz[result['question_num'] - 1]
-                        st.markdown(f"**Question:** {question['question']}")
-                        st.markdown(f"**Your Answer:** {result['user_answer']}")
-
-                        if not result['correct']:
-                            st.markdown(f"**Correct Answer:** {result['correct_answer']}")
-
-                        st.info(f"**Explanation:** {result['explanation']}")
-
-                # Action buttons
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("🔄 Generate New Quiz", use_container_width=True):
-                        st.session_state.quiz = None
-                        st.session_state.user_answers = {}
-                        st.session_state.quiz_submitted = False
-                        st.session_state.quiz_score = None
+                        quiz_result = {
+                            'success': True,
+                            'questions': [questions[i] for i in sorted(questions)],
+                            'error': None
+                        }
+                    except Exception as e:
+                        quiz_result = {
+                            'success': False,
+                            'questions': [],
+                            'error': f'Failed to generate quiz: {str(e)}'
+                        }
+                    progress.empty()
+
+                    if quiz_result['success']:
+                        store_quiz(quiz_result['questions'])
                         st.rerun()
-                with col2:
-                    # Download results
-                    results_text = f"""Quiz Results
-{'='*50}
-Score: {score['correct']}/{score['total']} ({score['percentage']:.1f}%)
-{feedback}
-
-{'='*50}
-Detailed Results:
-{'='*50}
-
-"""
-                    for result in score['results']:
-                        question = st.session_state.quiz[result['question_num'] - 1]
-                        results_text += f"""
-Question {result['question_num']}: {'✓' if result['correct'] else '✗'}
-{question['question']}
-Your Answer: {result['user_answer']}
-Correct Answer: {result['correct_answer']}
-Explanation: {result['explanation']}
-
-{'-'*50}
-"""
-
-                    st.download_button(
-                        label="⬇️ Download Results",
-                        data=results_text,
-                        file_name=f"{st.session_state.pdf_metadata['filename']}_results.txt",
-                        mime="text/plain"
-                    )
+                    else:
+                        st.error(f"❌ {quiz_result['error']}")
+        else:
+            # Display quiz (reruns independently of the rest of the page)
+            quiz_fragment()
 
 else:
     # Initial state - no PDF uploaded
@@ -0,0 +1,72 @@
+"""Regression checks for parse_quiz_text on out-of-order and wrapped agent output."""
+
+import os
+
+# utils.agent builds its API client at import time; no request is made in these tests
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("Base_URL", "https://example.invalid/v1/")
+
+from utils.agent import parse_quiz_text  # noqa: E402
+
+
+def test_wrapped_question_and_explanation_are_joined():
+    questions = parse_quiz_text(
+        "QUESTION: What is the capital\n"
+        "of France?\n"
+        "TYPE: mcq\n"
+        "OPTIONS: A) Paris | B) Rome | C) Oslo | D) Bern\n"
+        "ANSWER: A\n"
+        "EXPLANATION: Paris is\n"
+        "the capital."
+    )
+
+    assert len(questions) == 1
+    assert questions[0].question == "What is the capital of France?"
+    assert questions[0].correct_answer == "Paris"
+    assert questions[0].explanation == "Paris is the capital."
+
+
+def test_explanation_before_answer_keeps_the_answer():
+    questions = parse_quiz_text(
+        "QUESTION: The sky is green.\n"
+        "TYPE: true_false\n"
+        "OPTIONS: True | False\n"
+        "EXPLANATION: It is blue.\n"
+        "ANSWER: False"
+    )
+
+    assert len(questions) == 1
+    assert questions[0].correct_answer == "False"
+    assert questions[0].explanation == "It is blue."
+
+
+def test_answer_before_options_maps_the_letter():
+    questions = parse_quiz_text(
+        "QUESTION: Pick the third letter.\n"
+        "TYPE: mcq\n"
+        "ANSWER: C\n"
+        "OPTIONS: A) a | B) b | C) c | D) d\n"
+        "EXPLANATION: c is third."
+    )
+
+    assert len(questions) == 1
+    assert questions[0].options == ["a", "b", "c", "d"]
+    assert questions[0].correct_answer == "c"
+    assert questions[0].explanation == "c is third."
+
+
+def test_separated_questions_and_preamble():
+    questions = parse_quiz_text(
+        "Here is your quiz:\n"
+        "QUESTION 1: First?\n"
+        "TYPE: short_answer\n"
+        "ANSWER: one\n"
+        "===NEXT===\n"
+        "QUESTION 2: Second?\n"
+        "TYPE: true_false\n"
+        "ANSWER: true"
+    )
+
+    assert [q.question for q in questions] == ["First?", "Second?"]
+    assert questions[0].options is None
+    assert questions[1].correct_answer == "True"
@@ -1,16 +1,24 @@
 """OpenAI Agents SDK integration for PDF summarization and quiz generation."""
 
 import asyncio
+import functools
 import os
-from typing import List, Literal, Optional
+import re
+import threading
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from itertools import accumulate
+from typing import AsyncIterator, Dict, Iterator, List, Literal, Optional, Tuple
 from pydantic import BaseModel, Field
 from agents import Agent, Runner
 from agents.models.openai_chatcompletions import OpenAIChatCompletionsModel
-from openai import AsyncOpenAI
+import httpx
+from openai import APIConnectionError, AsyncOpenAI, DefaultAsyncHttpxClient, InternalServerError, RateLimitError
+from openai.types.responses import ResponseTextDeltaEvent
 from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from . import llm_cache
+from .pdf_extractor import PDFExtractor, _WORD_RE, count_words
 
 # Try to import streamlit for secrets management (for Streamlit Cloud deployment)
 try:
@@ -52,11 +60,19 @@ class QuizOutput(BaseModel):
 # Agent Configuration
 # =============================================================================
 
+@functools.cache
+def _load_env():
+    """Load environment variables from .env (once, on first use)."""
+    load_dotenv()
+
+
 def get_api_credentials():
     """
     Get API credentials from Streamlit secrets (for cloud deployment)
     or environment variables (for local development).
     """
+    _load_env()
+
     if STREAMLIT_AVAILABLE and hasattr(st, 'secrets'):
         try:
             # Try to get from Streamlit secrets first (for cloud deployment)
@@ -76,9 +92,19 @@ def get_api_credentials():
 # Get credentials
 gemini_api_key, gemini_base_url = get_api_credentials()
 
+# Single pooled HTTP client so concurrent calls reuse keep-alive connections
+# instead of paying a TLS handshake per request
+http_client = DefaultAsyncHttpxClient(
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=60)
+)
+
+# SDK retries are off: _run_with_retry is the only retry layer, and it backs off
+# outside the concurrency semaphore instead of sleeping while holding a slot
 external_client = AsyncOpenAI(
     api_key=gemini_api_key,
-    base_url=gemini_base_url
+    base_url=gemini_base_url,
+    http_client=http_client,
+    max_retries=0
 )
 
 configured_model = OpenAIChatCompletionsModel(
@@ -150,53 +176,105 @@ def create_quiz_agent() -> Agent:
     return agent
 
 
+# Agents are stateless between runs, so build them once and reuse them
+SUMMARIZER_AGENT = create_summarizer_agent()
+QUIZ_AGENT = create_quiz_agent()
+
+# Same summarizer, but returning a validated SummaryOutput (summary, word count, key topics)
+# in one call. Streaming and the per-chunk map step keep using the plain-text agent.
+STRUCTURED_SUMMARIZER_AGENT = SUMMARIZER_AGENT.clone(output_type=SummaryOutput)
+
+
+# Maximum number of LLM requests in flight at once (keeps us under Gemini rate limits)
+LLM_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+
+# Longest document put into a prompt, in estimated tokens. Kept above the 50k cap
+# applied at extraction so documents truncated there pass through unchanged.
+MAX_INPUT_TOKENS = int(os.getenv('LLM_MAX_INPUT_TOKENS', '60000'))
+
+
+def _cap_input(text: str) -> str:
+    """Truncate text to MAX_INPUT_TOKENS before it reaches any prompt."""
+    return PDFExtractor.truncate_text(text, max_tokens=MAX_INPUT_TOKENS)['text']
+
+
+@functools.cache
+def _llm_semaphore() -> asyncio.Semaphore:
+    """Process-wide LLM concurrency limit (created lazily, on the event loop that uses it)."""
+    return asyncio.Semaphore(LLM_CONCURRENCY)
+
+
+# Errors the OpenAI client would otherwise have retried itself (see max_retries=0)
+_RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+@retry(
+    wait=wait_exponential_jitter(initial=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type(_RETRYABLE_ERRORS),
+    reraise=True
+)
+async def _run_with_retry(agent: Agent, prompt: str):
+    """Run an agent, retrying with exponential backoff on rate limits and transient errors."""
+    async with _llm_semaphore():
+        return await Runner.run(agent, input=prompt)
+
+
 # =============================================================================
-# Summarization Functions
+# Text Chunking
 # =============================================================================
 
-async def generate_summary(
-    text: str,
-    length: Literal['brief', 'standard', 'detailed'] = 'standard',
-    format_type: Literal['bullets', 'paragraphs'] = 'paragraphs'
-) -> SummaryOutput:
+def chunk_text(text: str, max_tokens: int = 2000, overlap: int = 200) -> List[str]:
     """
-    Generate a summary of the provided text.
+    Split text into overlapping chunks of roughly max_tokens tokens.
 
     Args:
-        text: The text to summarize
-        length: Desired summary length (brief, standard, detailed)
-        format_type: Output format (bullets or paragraphs)
+        text: The text to split
+        max_tokens: Approximate chunk size in tokens (approximated from word count)
+        overlap: Approximate number of tokens shared by consecutive chunks
 
     Returns:
-        SummaryOutput with the generated summary
+        List of chunks; a single chunk if the text already fits
     """
-    # Define word count ranges
-    length_specs = {
-        'brief': '100-200',
-        'standard': '200-500',
-        'detailed': '500-800'
-    }
+    # Rough approximation: 1 token ≈ 0.75 words
+    chunk_words = max(1, int(max_tokens * 0.75))
+    overlap_words = min(int(overlap * 0.75), chunk_words - 1)
+    word_count = count_words(text)
 
-    # Create summarizer agent
-    agent = create_summarizer_agent()
+    if word_count <= chunk_words:
+        return [text]
 
-    # Construct prompt
-    format_instruction = (
-        "Format the summary as clear bullet points, one main idea per bullet."
-        if format_type == 'bullets'
-        else "Format the summary as flowing, well-connected paragraphs."
-    )
+    step = chunk_words - overlap_words
+    first_words = range(0, word_count - overlap_words, step)
+    last_words = [min(first + chunk_words, word_count) - 1 for first in first_words]
+
+    # One pass records the offsets of just the boundary words; chunks are slices
+    # of the original text, so line and paragraph breaks are kept
+    boundaries = set(first_words).union(last_words)
+    spans = {i: match.span() for i, match in enumerate(_WORD_RE.finditer(text)) if i in boundaries}
+    return [text[spans[first][0]:spans[last][1]] for first, last in zip(first_words, last_words)]
+
+
+# =============================================================================
+# Summarization Functions
+# =============================================================================
 
-    prompt = f"""Please summarize the following document.
+# Word count ranges for each summary length
+SUMMARY_LENGTH_SPECS = {
+    'brief': '100-200',
+    'standard': '200-500',
+    'detailed': '500-800'
+}
+
+
+# Static part of the summary prompt; the document text is appended after it
+SUMMARY_PROMPT_TEMPLATE = """Please summarize the document given at the end of this message.
 
 **Requirements:**
-- Length: {length_specs[length]} words ({length})
+- Length: {length_spec} words ({length})
 - Format: {format_instruction}
 - Extract and list the key topics covered
 
-**Document Text:**
-{text}
-
 **Output Format:**
 Provide:
 1. The summary (following the length and format requirements)
@@ -205,160 +283,308 @@ Provide:
 
 Ensure the summary is complete and doesn't cut off mid-sentence."""
 
-    # Run agent
-    result = await Runner.run(agent, input=prompt)
+# Streamed summaries are shown verbatim, so the model must output nothing but the summary
+STREAM_SUMMARY_PROMPT_TEMPLATE = """Please summarize the document given at the end of this message.
+
+**Requirements:**
+- Length: {length_spec} words ({length})
+- Format: {format_instruction}
+
+**Output Format:**
+Output only the summary itself. Do not add a title, a word count, a list of key topics,
+or any other commentary.
+
+Ensure the summary is complete and doesn't cut off mid-sentence."""
+
 
-    # Parse the response - the agent will provide structured text
-    summary_text = result.final_output
-    word_count = len(summary_text.split())
+def build_summary_prompt(
+    text: str,
+    length: Literal['brief', 'standard', 'detailed'] = 'standard',
+    format_type: Literal['bullets', 'paragraphs'] = 'paragraphs',
+    template: str = SUMMARY_PROMPT_TEMPLATE
+) -> str:
+    """
+    Build the summarization prompt for the given text and settings.
 
-    # Extract key topics from the summary (simple approach)
-    # In a real implementation, the agent could return structured data
-    key_topics = ["Document Analysis"]  # Placeholder
+    Args:
+        text: The text to summarize
+        length: Desired summary length (brief, standard, detailed)
+        format_type: Output format (bullets or paragraphs)
+        template: Instruction template (SUMMARY_PROMPT_TEMPLATE or STREAM_SUMMARY_PROMPT_TEMPLATE)
 
-    return SummaryOutput(
-        summary=summary_text,
-        word_count=word_count,
-        key_topics=key_topics
+    Returns:
+        The prompt to send to the summarizer agent
+    """
+    format_instruction = (
+        "Format the summary as clear bullet points, one main idea per bullet."
+        if format_type == 'bullets'
+        else "Format the summary as flowing, well-connected paragraphs."
     )
 
+    # Instructions first and the document last, so requests share a cacheable prefix
+    return template.format(
+        length_spec=SUMMARY_LENGTH_SPECS[length],
+        length=length,
+        format_instruction=format_instruction
+    ) + f"""
 
-# =============================================================================
-# Quiz Generation Functions
-# =============================================================================
+**Document Text:**
+{text}"""
 
-async def generate_quiz(
+
+async def summarize_chunk(text: str) -> str:
+    """
+    Summarize one section of a long document (the "map" step).
+
+    Args:
+        text: The section text
+
+    Returns:
+        A short summary of the section
+    """
+    prompt = f"""Summarize the following section of a larger document in 150-250 words.
+Keep the key facts, names, numbers and definitions; they will be combined with the
+summaries of the other sections into one final summary.
+
+**Section Text:**
+{text}"""
+
+    result = await _run_with_retry(SUMMARIZER_AGENT, prompt)
+    return result.final_output
+
+
+async def prepare_summary_source(text: str) -> str:
+    """
+    Reduce a long document to the text the final summary is written from.
+
+    Short documents are returned unchanged. Long ones are split with
+    chunk_text, each chunk is summarized concurrently, and the section
+    summaries are joined in document order.
+
+    Args:
+        text: The full document text
+
+    Returns:
+        Text to pass to build_summary_prompt
+    """
+    chunks = chunk_text(text)
+    if len(chunks) == 1:
+        return text
+
+    chunk_summaries = await asyncio.gather(*[summarize_chunk(c) for c in chunks])
+
+    return (
+        "(The document was long, so below are summaries of its consecutive sections.)\n\n"
+        + "\n\n".join(chunk_summaries)
+    )
+
+
+async def generate_summary(
     text: str,
-    num_questions: int = 5,
-    question_types: List[str] = None,
-    difficulty: Literal['easy', 'medium', 'hard'] = 'medium'
-) -> QuizOutput:
+    length: Literal['brief', 'standard', 'detailed'] = 'standard',
+    format_type: Literal['bullets', 'paragraphs'] = 'paragraphs'
+) -> SummaryOutput:
     """
-    Generate a quiz based on the provided text.
+    Generate a summary of the provided text.
 
     Args:
-        text: The text to generate quiz from
-        num_questions: Number of questions to generate
-        question_types: List of question types to include
-        difficulty: Difficulty level of questions
+        text: The text to summarize
+        length: Desired summary length (brief, standard, detailed)
+        format_type: Output format (bullets or paragraphs)
 
     Returns:
-        QuizOutput with the generated questions
+        SummaryOutput with the generated summary
     """
-    if question_types is None:
-        question_types = ['mcq', 'true_false', 'short_answer']
+    text = _cap_input(text)
 
-    # Create quiz agent
-    agent = create_quiz_agent()
+    # Identical requests are served from the response cache
+    cache_key = llm_cache.make_key('summary', text=text, length=length, format=format_type)
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        return SummaryOutput.model_validate_json(cached)
 
-    # Construct prompt
-    types_description = ", ".join(question_types)
+    # Map long documents to section summaries, then construct the reduce prompt
+    source_text = await prepare_summary_source(text)
+    prompt = build_summary_prompt(source_text, length, format_type)
 
-    prompt = f"""Create a quiz with EXACTLY {num_questions} questions based on the following document.
+    # Run agent - the SDK validates the structured output for us
+    result = await _run_with_retry(STRUCTURED_SUMMARIZER_AGENT, prompt)
+    summary = result.final_output_as(SummaryOutput)
 
-**Requirements:**
-- Generate ALL {num_questions} questions
-- Question types to use: {types_description}
-- Difficulty level: {difficulty}
-- Mix the question types if multiple types are specified
-- Cover different parts of the document
+    # Models are bad at counting their own words, so recount what is displayed
+    summary.word_count = count_words(summary.summary)
 
-**Document Text:**
-{text}
+    await llm_cache.put(cache_key, summary.model_dump_json())
+    return summary
+
+
+async def stream_summary(
+    text: str,
+    length: Literal['brief', 'standard', 'detailed'] = 'standard',
+    format_type: Literal['bullets', 'paragraphs'] = 'paragraphs'
+) -> AsyncIterator[str]:
+    """
+    Stream a summary of the provided text as it is generated.
+
+    For long documents the section summaries are produced first; only the
+    final combining call is streamed. The output is the summary text alone;
+    key topics are only returned by generate_summary.
+
+    Args:
+        text: The text to summarize
+        length: Desired summary length (brief, standard, detailed)
+        format_type: Output format (bullets or paragraphs)
+
+    Yields:
+        Text deltas of the summary, in order
+    """
+    text = _cap_input(text)
+    source_text = await prepare_summary_source(text)
+    prompt = build_summary_prompt(source_text, length, format_type, STREAM_SUMMARY_PROMPT_TEMPLATE)
 
-**CRITICAL: You MUST generate ALL {num_questions} questions using this EXACT format for EACH question:**
+    # A partially streamed answer can't be retried, but it still counts against the limit
+    async with _llm_semaphore():
+        result = Runner.run_streamed(SUMMARIZER_AGENT, input=prompt)
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                yield event.data.delta
+
+
+# =============================================================================
+# Quiz Generation Functions
+# =============================================================================
 
-QUESTION 1: [Write the first question here]
+# Per-type format examples used by the single-question prompt
+QUESTION_FORMATS = {
+    'mcq': """QUESTION 1: [Write the question here]
 TYPE: mcq
 OPTIONS: A) first option | B) second option | C) third option | D) fourth option
 ANSWER: A
-EXPLANATION: [Why A is correct with reference to the document]
-
-===NEXT===
-
-QUESTION 2: [Write the second question here]
+EXPLANATION: [Why A is correct with reference to the document]""",
+    'true_false': """QUESTION 1: [Write the statement here]
 TYPE: true_false
 OPTIONS: True | False
 ANSWER: True
-EXPLANATION: [Why this is true with reference to the document]
+EXPLANATION: [Why this is true with reference to the document]""",
+    'short_answer': """QUESTION 1: [Write the question here]
+TYPE: short_answer
+OPTIONS:
+ANSWER: [A model answer in one or two sentences]
+EXPLANATION: [Why this is the answer with reference to the document]""",
+}
+
+# Static prefix shared by every single-question prompt (identical across question
+# types and documents, so providers can cache it); the document and the
+# per-question requirements follow it
+QUESTION_PROMPT_PREFIX = f"""Create ONE quiz question based on the document given below.
 
-===NEXT===
+**CRITICAL: You MUST use the EXACT format for the requested question type:**
 
-[Continue this pattern for ALL {num_questions} questions]
+Multiple choice (mcq):
+{QUESTION_FORMATS['mcq']}
+
+True/False (true_false):
+{QUESTION_FORMATS['true_false']}
+
+Short answer (short_answer):
+{QUESTION_FORMATS['short_answer']}
 
 **IMPORTANT NOTES:**
-- Use "===NEXT===" to separate each question
+- Generate exactly one question and nothing else
 - For TYPE, use exactly: mcq, true_false, or short_answer
 - For MCQ, provide exactly 4 options separated by " | "
 - For True/False, use exactly: "True | False"
-- For Short Answer, leave OPTIONS blank
-- Generate ALL {num_questions} questions before stopping"""
+- For Short Answer, leave OPTIONS blank"""
 
-    # Run agent
-    result = await Runner.run(agent, input=prompt)
+# One labelled line of the QUESTION/TYPE/OPTIONS/ANSWER/EXPLANATION format
+# (numbered labels such as "QUESTION 2:" included); matched on stripped lines
+_QUIZ_FIELD_RE = re.compile(r'^(?P<label>QUESTION|TYPE|OPTIONS|ANSWER|EXPLANATION)[^:]*:\s*(?P<value>.*)$')
+# Free-text fields the model may wrap onto following, unlabelled lines
+_WRAPPING_FIELDS = frozenset({'QUESTION', 'EXPLANATION'})
 
-    # Parse the response into structured questions
-    quiz_text = result.final_output
-    questions = []
+# Quiz parsing constants, built once instead of on every parse
+_DEFAULT_QTYPES = ('mcq', 'true_false', 'short_answer')
+_OPTION_QTYPES = frozenset({'mcq', 'true_false'})
+_ANSWER_LETTER_MAP = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+_OPT_SPLIT_RE = re.compile(r'\s*\|\s*')
+# Option label such as "A)", "b.", or "(C)"
+_OPT_LABEL_RE = re.compile(r'^\(?[A-Da-d][\.\)]\s*')
 
-    # Split by question separator
-    question_blocks = quiz_text.split('===NEXT===')
 
-    for block in question_blocks:
-        if not block.strip():
+def _quiz_field_blocks(quiz_text: str) -> Iterator[Dict[str, str]]:
+    """
+    Split the agent's quiz output into one {label: value} dict per question.
+
+    Each labelled line is read on its own, so the fields may come in any order.
+    A ===NEXT=== separator or a second QUESTION line starts the next question,
+    and unlabelled lines continue a wrapped QUESTION or EXPLANATION.
+    """
+    fields = {}
+    last_label = None
+    for line in quiz_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith('===NEXT==='):
+            if fields:
+                yield fields
+            fields, last_label = {}, None
             continue
 
-        lines = [line.strip() for line in block.strip().split('\n') if line.strip()]
+        match = _QUIZ_FIELD_RE.match(line)
+        if match:
+            last_label = match['label']
+            if last_label == 'QUESTION' and 'QUESTION' in fields:
+                yield fields
+                fields = {}
+            fields[last_label] = match['value']
+        elif last_label in _WRAPPING_FIELDS:
+            fields[last_label] += ' ' + line
 
-        if len(lines) < 3:  # At least QUESTION, TYPE, and ANSWER
+    if fields:
+        yield fields
+
+
+def parse_quiz_text(quiz_text: str) -> List[QuizQuestion]:
+    """
+    Parse the agent's plain-text quiz output into structured questions.
+
+    Args:
+        quiz_text: Raw agent output using the QUESTION/TYPE/OPTIONS/ANSWER/EXPLANATION format
+
+    Returns:
+        List of parsed QuizQuestion objects
+    """
+    questions = []
+
+    for fields in _quiz_field_blocks(quiz_text):
+        # At least QUESTION, TYPE, and ANSWER (or two other fields)
+        if len(fields) < 3:
             continue
 
-        # Initialize variables
-        question_text = ""
-        q_type = "mcq"
+        question_text = fields.get('QUESTION', '')
+        q_type = fields['TYPE'].lower() if fields.get('TYPE') else "mcq"
         options = []
         correct_answer = ""
-        explanation = ""
-
-        # Parse each line
-        for line in lines:
-            if line.startswith("QUESTION"):
-                # Extract question text after the colon
-                if ":" in line:
-                    question_text = line.split(":", 1)[1].strip()
-                else:
-                    question_text = line
-            elif line.startswith("TYPE:"):
-                q_type = line.split(":", 1)[1].strip().lower()
-            elif line.startswith("OPTIONS:"):
-                opts_text = line.split(":", 1)[1].strip()
-                if "|" in opts_text:
-                    options = [opt.strip() for opt in opts_text.split("|")]
-                    # Clean up option labels (A), B), etc.)
-                    cleaned_options = []
-                    for opt in options:
-                        if ")" in opt:
-                            # Remove "A)" or "A." prefix
-                            cleaned = opt.split(")", 1)[1].strip()
-                        elif "." in opt and len(opt.split(".")[0]) <= 2:
-                            cleaned = opt.split(".", 1)[1].strip()
-                        else:
-                            cleaned = opt
-                        cleaned_options.append(cleaned)
-                    options = cleaned_options
-            elif line.startswith("ANSWER:"):
-                answer_text = line.split(":", 1)[1].strip()
-                # For MCQ, map letter to actual option
-                if q_type == "mcq" and len(answer_text) == 1 and answer_text.upper() in "ABCD":
-                    idx = ord(answer_text.upper()) - ord('A')
-                    if 0 <= idx < len(options):
-                        correct_answer = options[idx]
-                    else:
-                        correct_answer = options[0] if options else "Option A"
-                else:
-                    correct_answer = answer_text
-            elif line.startswith("EXPLANATION:"):
-                explanation = line.split(":", 1)[1].strip()
+        explanation = fields.get('EXPLANATION', '')
+
+        # Resolved after the whole block is read, so the field order doesn't matter
+        opts_text = fields.get('OPTIONS', '')
+        if "|" in opts_text:
+            # Split on the separator and drop the option labels (A), B), etc.)
+            options = [_OPT_LABEL_RE.sub('', opt) for opt in _OPT_SPLIT_RE.split(opts_text)]
+
+        answer_text = fields.get('ANSWER', '')
+        # For MCQ, map letter to actual option
+        idx = _ANSWER_LETTER_MAP.get(answer_text.upper())
+        if q_type == "mcq" and idx is not None:
+            if idx < len(options):
+                correct_answer = options[idx]
+            else:
+                correct_answer = options[0] if options else "Option A"
+        else:
+            correct_answer = answer_text
 
         # Validate and create question object
         if question_text:
@@ -385,24 +611,320 @@ EXPLANATION: [Why this is true with reference to the document]
             question_obj = QuizQuestion(
                 question=question_text,
                 type=q_type,
-                options=options if q_type in ['mcq', 'true_false'] else None,
+                options=options if q_type in _OPTION_QTYPES else None,
                 correct_answer=correct_answer if correct_answer else "Not specified",
                 explanation=explanation if explanation else "Based on the document content."
             )
             questions.append(question_obj)
 
+    return questions
+
+
+def allocate_questions(chunks: List[str], num_questions: int) -> List[int]:
+    """
+    Assign each question to a chunk, proportionally to chunk length.
+
+    Args:
+        chunks: Document chunks from chunk_text
+        num_questions: Number of questions to distribute
+
+    Returns:
+        Chunk index for each question, in document order
+    """
+    boundaries = list(accumulate(len(c) for c in chunks))
+    total = boundaries[-1]
+    # Place question i at the middle of its equal share of the document
+    return [
+        min(bisect_right(boundaries, (i + 0.5) * total / num_questions), len(chunks) - 1)
+        for i in range(num_questions)
+    ]
+
+
+async def generate_one_question(
+    text: str,
+    qtype: str,
+    difficulty: str,
+    idx: int,
+    total: int
+) -> Optional[QuizQuestion]:
+    """
+    Generate a single quiz question with its own focused agent call.
+
+    Args:
+        text: The text to generate the question from
+        qtype: Question type (mcq, true_false, short_answer)
+        difficulty: Difficulty level of the question
+        idx: Zero-based position of this question among those drawn from text
+        total: Number of questions being drawn from text
+
+    Returns:
+        The parsed QuizQuestion, or None if the output could not be parsed
+    """
+    # Static prefix, then the document (shared by all questions on this text),
+    # then the small per-question part
+    prompt = QUESTION_PROMPT_PREFIX + f"""
+
+**Document Text:**
+{text}
+
+**Requirements for this question:**
+- Question type: {qtype}
+- Difficulty level: {difficulty}
+- This is question {idx + 1} of {total}: focus on part {idx + 1} of {total} of the document
+  so that the quiz covers different parts of the document"""
+
+    result = await _run_with_retry(QUIZ_AGENT, prompt)
+
+    questions = parse_quiz_text(result.final_output)
+    return questions[0] if questions else None
+
+
+async def _numbered(position: int, coro):
+    """Await coro and return (position, result), returning exceptions instead of raising."""
+    try:
+        return position, await coro
+    except Exception as e:
+        return position, e
+
+
+async def stream_quiz(
+    text: str,
+    num_questions: int = 5,
+    question_types: List[str] = None,
+    difficulty: Literal['easy', 'medium', 'hard'] = 'medium',
+    refresh: bool = False
+) -> AsyncIterator[Tuple[int, QuizQuestion]]:
+    """
+    Generate a quiz, yielding each question as soon as it is ready.
+
+    Each question is generated by its own agent call and the calls run
+    concurrently, so the first question arrives after roughly one call.
+    Long documents are chunked and each question only receives its chunk.
+
+    Args:
+        text: The text to generate quiz from
+        num_questions: Number of questions to generate
+        question_types: List of question types to include
+        difficulty: Difficulty level of questions
+        refresh: Skip the cached quiz for these settings and generate a new one
+
+    Yields:
+        (position, QuizQuestion) pairs in completion order; position is the
+        question's place in the quiz
+    """
+    if question_types is None:
+        question_types = _DEFAULT_QTYPES
+
+    text = _cap_input(text)
+
+    # Identical requests are served from the response cache
+    cache_key = llm_cache.make_key(
+        'quiz', text=text, n=num_questions, types=sorted(question_types), diff=difficulty
+    )
+    if not refresh:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            for position, question in enumerate(QuizOutput.model_validate_json(cached).questions):
+                yield position, question
+            return
+
+    # Spread questions over the chunks in proportion to their length
+    chunks = chunk_text(text)
+    question_chunks = allocate_questions(chunks, num_questions)
+    chunk_totals = Counter(question_chunks)
+    chunk_positions = defaultdict(int)
+
+    # One task per question, round-robin across the requested types
+    tasks = []
+    for i, chunk_idx in enumerate(question_chunks):
+        tasks.append(asyncio.ensure_future(_numbered(i, generate_one_question(
+            chunks[chunk_idx],
+            question_types[i % len(question_types)],
+            difficulty,
+            chunk_positions[chunk_idx],
+            chunk_totals[chunk_idx]
+        ))))
+        chunk_positions[chunk_idx] += 1
+
+    questions = {}
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            position, result = await next_done
+            if isinstance(result, QuizQuestion):
+                questions[position] = result
+                yield position, result
+            elif isinstance(result, BaseException):
+                errors.append(result)
+    finally:
+        # The consumer may stop early; don't leave requests running
+        for task in tasks:
+            task.cancel()
+
+    # Nothing succeeded - surface the first failure to the caller
+    if not questions and errors:
+        raise errors[0]
+
+    # Every request returned, but no output could be parsed into a question
+    if not questions:
+        raise ValueError("The model's output could not be parsed into any quiz questions")
+
     # Log for debugging if not enough questions
     if len(questions) < num_questions:
-        print(f"Warning: Only parsed {len(questions)} questions out of {num_questions} requested")
-        print(f"Raw output length: {len(quiz_text)} characters")
+        print(f"Warning: Only generated {len(questions)} questions out of {num_questions} requested")
+        if errors:
+            print(f"Failed question requests: {len(errors)} (first error: {errors[0]})")
 
-    return QuizOutput(questions=questions if questions else [])
+    # Only complete quizzes are cached; partial ones came from failed requests
+    if not errors and len(questions) == num_questions:
+        quiz = QuizOutput(questions=[questions[i] for i in sorted(questions)])
+        await llm_cache.put(cache_key, quiz.model_dump_json())
+
+
+async def generate_quiz(
+    text: str,
+    num_questions: int = 5,
+    question_types: List[str] = None,
+    difficulty: Literal['easy', 'medium', 'hard'] = 'medium',
+    refresh: bool = False
+) -> QuizOutput:
+    """
+    Generate a quiz based on the provided text.
+
+    Collects stream_quiz into a complete quiz, in question order.
+
+    Args:
+        text: The text to generate quiz from
+        num_questions: Number of questions to generate
+        question_types: List of question types to include
+        difficulty: Difficulty level of questions
+        refresh: Skip the cached quiz for these settings and generate a new one
+
+    Returns:
+        QuizOutput with the generated questions
+    """
+    questions = {}
+    async for position, question in stream_quiz(
+        text, num_questions, question_types, difficulty, refresh
+    ):
+        questions[position] = question
+
+    return QuizOutput(questions=[questions[i] for i in sorted(questions)])
+
+
+async def generate_quiz_batch(
+    texts: List[str],
+    num_questions: int = 5,
+    question_types: List[str] = None,
+    difficulty: Literal['easy', 'medium', 'hard'] = 'medium'
+) -> List[QuizOutput]:
+    """
+    Generate one quiz per document concurrently.
+
+    All question requests across all documents share the process-wide LLM
+    concurrency limit, so a large batch stays under the provider's rate limit.
+
+    Args:
+        texts: The documents to generate quizzes from
+        num_questions: Number of questions per quiz
+        question_types: List of question types to include
+        difficulty: Difficulty level of questions
+
+    Returns:
+        List of QuizOutput (or the exception raised for that document), in
+        the same order as texts
+    """
+    return await asyncio.gather(
+        *[generate_quiz(text, num_questions, question_types, difficulty) for text in texts],
+        return_exceptions=True
+    )
+
+
+# =============================================================================
+# Combined Generation
+# =============================================================================
+
+async def generate_summary_and_quiz(
+    text: str,
+    length: Literal['brief', 'standard', 'detailed'] = 'standard',
+    format_type: Literal['bullets', 'paragraphs'] = 'paragraphs',
+    num_questions: int = 5,
+    question_types: List[str] = None,
+    difficulty: Literal['easy', 'medium', 'hard'] = 'medium'
+):
+    """
+    Generate the summary and the quiz concurrently.
+
+    Both only depend on the document text, so running them together costs
+    one round-trip instead of two.
+
+    Returns:
+        Tuple of (SummaryOutput or exception, QuizOutput or exception)
+    """
+    summary, quiz = await asyncio.gather(
+        generate_summary(text, length, format_type),
+        generate_quiz(text, num_questions, question_types, difficulty),
+        return_exceptions=True
+    )
+    return summary, quiz
 
 
 # =============================================================================
 # Synchronous Wrappers for Streamlit
 # =============================================================================
 
+# One long-lived event loop for all agent calls. asyncio.run() would create and
+# tear down a loop per call, dropping the pooled keep-alive connections each time.
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, name="agent-event-loop", daemon=True).start()
+
+
+def run_async(coro):
+    """Run a coroutine on the shared background event loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+def _summary_result(result: SummaryOutput) -> dict:
+    """Convert a SummaryOutput into the dictionary returned to Streamlit."""
+    return {
+        'success': True,
+        'summary': result.summary,
+        'word_count': result.word_count,
+        'key_topics': result.key_topics,
+        'error': None
+    }
+
+
+def _summary_error(e: BaseException) -> dict:
+    """Build the failure dictionary for summary generation."""
+    return {
+        'success': False,
+        'summary': '',
+        'word_count': 0,
+        'key_topics': [],
+        'error': f'Failed to generate summary: {str(e)}'
+    }
+
+
+def _quiz_result(result: QuizOutput) -> dict:
+    """Convert a QuizOutput into the dictionary returned to Streamlit."""
+    return {
+        'success': True,
+        # One serializer pass over the whole quiz rather than one per question
+        'questions': result.model_dump()['questions'],
+        'error': None
+    }
+
+
+def _quiz_error(e: BaseException) -> dict:
+    """Build the failure dictionary for quiz generation."""
+    return {
+        'success': False,
+        'questions': [],
+        'error': f'Failed to generate quiz: {str(e)}'
+    }
+
+
 def generate_summary_sync(
     text: str,
     length: str = 'standard',
@@ -420,29 +942,18 @@ def generate_summary_sync(
         Dictionary with summary data
     """
     try:
-        result = asyncio.run(generate_summary(text, length, format_type))
-        return {
-            'success': True,
-            'summary': result.summary,
-            'word_count': result.word_count,
-            'key_topics': result.key_topics,
-            'error': None
-        }
+        result = run_async(generate_summary(text, length, format_type))
+        return _summary_result(result)
     except Exception as e:
-        return {
-            'success': False,
-            'summary': '',
-            'word_count': 0,
-            'key_topics': [],
-            'error': f'Failed to generate summary: {str(e)}'
-        }
+        return _summary_error(e)
 
 
 def generate_quiz_sync(
     text: str,
     num_questions: int = 5,
     question_types: List[str] = None,
-    difficulty: str = 'medium'
+    difficulty: str = 'medium',
+    refresh: bool = False
 ) -> dict:
     """
     Synchronous wrapper for generate_quiz.
@@ -452,20 +963,133 @@ def generate_quiz_sync(
         num_questions: Number of questions
         question_types: List of question types
         difficulty: Difficulty level
+        refresh: Skip the cached quiz and generate a new one
 
     Returns:
         Dictionary with quiz data
     """
     try:
-        result = asyncio.run(generate_quiz(text, num_questions, question_types, difficulty))
-        return {
-            'success': True,
-            'questions': [q.model_dump() for q in result.questions],
-            'error': None
-        }
+        result = run_async(generate_quiz(text, num_questions, question_types, difficulty, refresh))
+        return _quiz_result(result)
+    except Exception as e:
+        return _quiz_error(e)
+
+
+def stream_summary_sync(
+    text: str,
+    length: str = 'standard',
+    format_type: str = 'paragraphs'
+) -> Iterator[str]:
+    """
+    Synchronous generator wrapper for stream_summary (for st.write_stream).
+
+    Args:
+        text: The text to summarize
+        length: Desired summary length
+        format_type: Output format
+
+    Yields:
+        Text deltas of the summary, in order
+    """
+    stream = stream_summary(text, length, format_type)
+    try:
+        while True:
+            try:
+                yield run_async(stream.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        run_async(stream.aclose())
+
+
+def generate_quiz_batch_sync(
+    texts: List[str],
+    num_questions: int = 5,
+    question_types: List[str] = None,
+    difficulty: str = 'medium'
+) -> List[dict]:
+    """
+    Synchronous wrapper for generate_quiz_batch.
+
+    Args:
+        texts: The documents to generate quizzes from
+        num_questions: Number of questions per quiz
+        question_types: List of question types
+        difficulty: Difficulty level
+
+    Returns:
+        One quiz dictionary (as returned by generate_quiz_sync) per document
+    """
+    results = run_async(generate_quiz_batch(texts, num_questions, question_types, difficulty))
+    return [
+        _quiz_error(result) if isinstance(result, BaseException) else _quiz_result(result)
+        for result in results
+    ]
+
+
+def stream_quiz_sync(
+    text: str,
+    num_questions: int = 5,
+    question_types: List[str] = None,
+    difficulty: str = 'medium',
+    refresh: bool = False
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Synchronous generator wrapper for stream_quiz.
+
+    Args:
+        text: The text to generate quiz from
+        num_questions: Number of questions
+        question_types: List of question types
+        difficulty: Difficulty level
+        refresh: Skip the cached quiz and generate a new one
+
+    Yields:
+        (position, question dict) pairs as each question is ready
+    """
+    stream = stream_quiz(text, num_questions, question_types, difficulty, refresh)
+    try:
+        while True:
+            try:
+                position, question = run_async(stream.__anext__())
+            except StopAsyncIteration:
+                break
+            yield position, question.model_dump()
+    finally:
+        run_async(stream.aclose())
+
+
+def generate_summary_and_quiz_sync(
+    text: str,
+    length: str = 'standard',
+    format_type: str = 'paragraphs',
+    num_questions: int = 5,
+    question_types: List[str] = None,
+    difficulty: str = 'medium'
+) -> dict:
+    """
+    Synchronous wrapper for generate_summary_and_quiz.
+
+    Args:
+        text: The source document text
+        length: Desired summary length
+        format_type: Summary output format
+        num_questions: Number of questions
+        question_types: List of question types
+        difficulty: Difficulty level
+
+    Returns:
+        Dictionary with 'summary' and 'quiz' keys, each holding the same
+        dictionary the individual sync wrappers return
+    """
+    try:
+        summary, quiz = run_async(generate_summary_and_quiz(
+            text, length, format_type, num_questions, question_types, difficulty
+        ))
     except Exception as e:
-        return {
-            'success': False,
-            'questions': [],
-            'error': f'Failed to generate quiz: {str(e)}'
-        }
+        return {'summary': _summary_error(e), 'quiz': _quiz_error(e)}
+
+    return {
+        'summary': _summary_error(summary) if isinstance(summary, BaseException) else _summary_result(summary),
+        'quiz': _quiz_error(quiz) if isinstance(quiz, BaseException) else _quiz_result(quiz)
+    }
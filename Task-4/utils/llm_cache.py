@@ -0,0 +1,137 @@
+"""Response cache for LLM calls: an in-memory LRU, optionally backed by Redis."""
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# Redis is optional - without it (or without REDIS_URL) only the in-memory cache is used
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+MAX_ENTRIES = 256
+DEFAULT_TTL = 24 * 60 * 60  # 24 hours, in seconds
+KEY_PREFIX = "llm_cache:"
+REDIS_TIMEOUT = 0.5  # seconds; a slow or unreachable Redis is treated as a miss
+
+# key -> (expires_at, value), least recently used first
+_memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+@functools.cache
+def _redis_client():
+    """Return a Redis client if Redis is installed and REDIS_URL is set and valid, else None."""
+    redis_url = os.getenv("REDIS_URL")
+    if not (REDIS_AVAILABLE and redis_url):
+        return None
+    try:
+        return redis.Redis.from_url(
+            redis_url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT
+        )
+    except ValueError:
+        # Malformed URL: the cache must never break generation, so stay memory-only
+        return None
+
+
+def make_key(namespace: str, **params) -> str:
+    """
+    Build a cache key from a namespace and the parameters of a call.
+
+    Args:
+        namespace: Kind of response being cached (e.g. 'summary', 'quiz')
+        **params: JSON-serializable call parameters
+
+    Returns:
+        Key of the form '<namespace>:<sha256 of the parameters>'
+    """
+    payload = json.dumps(params, sort_keys=True).encode()
+    return f"{namespace}:{hashlib.sha256(payload).hexdigest()}"
+
+
+async def get(key: str) -> Optional[str]:
+    """
+    Look up a cached value.
+
+    Redis calls run in a worker thread so they never block the event loop.
+
+    Args:
+        key: Key from make_key
+
+    Returns:
+        The cached string, or None on a miss or after the entry expired
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                _memory.move_to_end(key)
+                return value
+            del _memory[key]
+
+    client = _redis_client()
+    if client is None:
+        return None
+
+    try:
+        found = await asyncio.to_thread(_redis_get, client, KEY_PREFIX + key)
+    except redis.RedisError:
+        return None
+    if found is None:
+        return None
+
+    # Promote to memory for the rest of the entry's lifetime
+    value, remaining_ttl = found
+    value = value.decode()
+    _put_memory(key, value, remaining_ttl if remaining_ttl > 0 else DEFAULT_TTL)
+    return value
+
+
+async def put(key: str, value: str, ttl: int = DEFAULT_TTL) -> None:
+    """
+    Store a value in the cache.
+
+    Args:
+        key: Key from make_key
+        value: String to cache (e.g. a model's JSON dump)
+        ttl: Time to live in seconds
+    """
+    _put_memory(key, value, ttl)
+
+    client = _redis_client()
+    if client is None:
+        return
+
+    try:
+        await asyncio.to_thread(client.set, KEY_PREFIX + key, value, ex=ttl)
+    except redis.RedisError:
+        # The cache must never break generation; the in-memory copy is enough
+        pass
+
+
+def _redis_get(client, redis_key: str) -> Optional[Tuple[bytes, int]]:
+    """Fetch a value and its remaining TTL from Redis (blocking; run in a thread)."""
+    value = client.get(redis_key)
+    if value is None:
+        return None
+    return value, client.ttl(redis_key)
+
+
+def _put_memory(key: str, value: str, ttl: int) -> None:
+    """Store a value in the in-memory LRU, evicting the oldest entries when full."""
+    with _lock:
+        _memory[key] = (time.monotonic() + ttl, value)
+        _memory.move_to_end(key)
+        while len(_memory) > MAX_ENTRIES:
+            _memory.popitem(last=False)
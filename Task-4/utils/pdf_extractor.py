@@ -1,7 +1,24 @@
 """PDF text extraction utility using PyMuPDF."""
 
+import io
+import re
+from itertools import islice
 import fitz  # PyMuPDF
-from typing import Dict, Any
+from typing import Dict, Any, BinaryIO, Optional
+
+
+# Matches one whitespace-delimited word (same words as str.split(), without building a list)
+_WORD_RE = re.compile(r'\S+')
+
+
+def count_words(text: str) -> int:
+    """Count whitespace-delimited words (same result as len(text.split()), without the list)."""
+    return sum(1 for _ in _WORD_RE.finditer(text))
+
+
+# Plain-text extraction flags: keep the default clipping to the page, but skip
+# preserving ligatures and whitespace runs (expanded ligatures also read better to the LLM)
+_TEXT_FLAGS = fitz.TEXT_MEDIABOX_CLIP
 
 
 class PDFExtractor:
@@ -10,14 +27,18 @@ class PDFExtractor:
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB in bytes
     MAX_PAGES = 50
     MIN_WORD_COUNT = 100
+    SCAN_PROBE_PAGES = 5  # Pages read before deciding a PDF has no text layer
+    PDF_MAGIC = b'%PDF-'
+    HEADER_SEARCH_BYTES = 1024  # Readers accept the header anywhere in the first 1KB
+    READ_CHUNK_SIZE = 1024 * 1024  # 1MB reads when validating a stream
 
     @staticmethod
-    def validate_pdf(file_data: bytes, file_name: str) -> Dict[str, Any]:
+    def validate_pdf(file_obj: BinaryIO, file_name: str) -> Dict[str, Any]:
         """
         Validate PDF file before processing.
 
         Args:
-            file_data: The PDF file bytes
+            file_obj: Seekable binary buffer holding the PDF (e.g. io.BytesIO)
             file_name: Name of the file
 
         Returns:
@@ -27,22 +48,71 @@ class PDFExtractor:
         if not file_name.lower().endswith('.pdf'):
             return {'valid': False, 'error': 'Invalid file type. Please upload a PDF file.'}
 
-        # Check file size
-        if len(file_data) > PDFExtractor.MAX_FILE_SIZE:
+        # Check file size without copying the buffer
+        file_obj.seek(0, io.SEEK_END)
+        file_size = file_obj.tell()
+        file_obj.seek(0)
+        if file_size > PDFExtractor.MAX_FILE_SIZE:
             return {
                 'valid': False,
                 'error': f'File size exceeds {PDFExtractor.MAX_FILE_SIZE // (1024*1024)}MB limit.'
             }
 
+        # Check the PDF header (a byte compare, no parsing)
+        header = file_obj.read(PDFExtractor.HEADER_SEARCH_BYTES)
+        file_obj.seek(0)
+        if PDFExtractor.PDF_MAGIC not in header:
+            return {'valid': False, 'error': 'File is not a valid PDF document.'}
+
         return {'valid': True, 'error': None}
 
     @staticmethod
-    def extract_text(file_data: bytes) -> Dict[str, Any]:
+    def validate_pdf_stream(file_obj: BinaryIO, file_name: str, size_hint: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Validate a PDF while reading it, never reading past the size limit.
+
+        Args:
+            file_obj: Readable binary stream positioned at the start of the file
+            file_name: Name of the file
+            size_hint: Size in bytes if already known (e.g. UploadedFile.size)
+
+        Returns:
+            Dict with 'valid' (bool), 'error' (str) and 'buffer' (io.BytesIO with
+            the accepted bytes, or None) keys
+        """
+        too_large = {
+            'valid': False,
+            'error': f'File size exceeds {PDFExtractor.MAX_FILE_SIZE // (1024*1024)}MB limit.',
+            'buffer': None
+        }
+
+        if not file_name.lower().endswith('.pdf'):
+            return {'valid': False, 'error': 'Invalid file type. Please upload a PDF file.', 'buffer': None}
+
+        # Reject on the reported size before reading anything
+        if size_hint is not None and size_hint > PDFExtractor.MAX_FILE_SIZE:
+            return too_large
+
+        # Copy in chunks and stop as soon as the limit is crossed
+        buffer = io.BytesIO()
+        total = 0
+        while chunk := file_obj.read(PDFExtractor.READ_CHUNK_SIZE):
+            total += len(chunk)
+            if total > PDFExtractor.MAX_FILE_SIZE:
+                return too_large
+            buffer.write(chunk)
+
+        validation = PDFExtractor.validate_pdf(buffer, file_name)
+        validation['buffer'] = buffer if validation['valid'] else None
+        return validation
+
+    @staticmethod
+    def extract_text(file_obj: BinaryIO) -> Dict[str, Any]:
         """
         Extract text from PDF file.
 
         Args:
-            file_data: The PDF file bytes
+            file_obj: Seekable binary buffer holding the PDF (e.g. io.BytesIO)
 
         Returns:
             Dict with:
@@ -53,8 +123,10 @@ class PDFExtractor:
                 - error (str): Error message if any
         """
         try:
-            # Open PDF from bytes
-            pdf_document = fitz.open(stream=file_data, filetype="pdf")
+            # Open PDF straight from the in-memory buffer (BytesIO is used as-is, no copy)
+            file_obj.seek(0)
+            stream = file_obj if isinstance(file_obj, io.BytesIO) else file_obj.read()
+            pdf_document = fitz.open(stream=stream, filetype="pdf")
 
             # Check if PDF is encrypted/password-protected
             if pdf_document.is_encrypted:
@@ -75,11 +147,22 @@ class PDFExtractor:
                 pass
 
             # Extract text from all pages
-            extracted_text = ""
-            for page_num in range(min(page_count, PDFExtractor.MAX_PAGES)):
-                page = pdf_document[page_num]
-                extracted_text += page.get_text()
-
+            pages_to_read = min(page_count, PDFExtractor.MAX_PAGES)
+
+            # Scanned PDFs have no text layer: read a few pages first and give up early if they are empty
+            probe_pages = min(pages_to_read, PDFExtractor.SCAN_PROBE_PAGES)
+            extracted_text = "".join(
+                pdf_document[page_num].get_text("text", flags=_TEXT_FLAGS)
+                for page_num in range(probe_pages)
+            )
+            remaining_pages = pages_to_read - probe_pages if _WORD_RE.search(extracted_text) else 0
+
+            # Sequential on purpose: at MAX_PAGES a worker pool's start-up and PDF transfer
+            # cost several times more than extracting every page here
+            extracted_text += "".join(
+                pdf_document[page_num].get_text("text", flags=_TEXT_FLAGS)
+                for page_num in range(probe_pages, probe_pages + remaining_pages)
+            )
             pdf_document.close()
 
             # Check if text was extracted
@@ -93,7 +176,7 @@ class PDFExtractor:
                 }
 
             # Count words
-            word_count = len(extracted_text.split())
+            word_count = count_words(extracted_text)
 
             # Check minimum word count
             if word_count < PDFExtractor.MIN_WORD_COUNT:
@@ -133,23 +216,35 @@ class PDFExtractor:
             max_tokens: Maximum number of tokens (approximated as words * 1.3)
 
         Returns:
-            Dict with 'text' (str) and 'truncated' (bool)
+            Dict with 'text' (str), 'truncated' (bool) and 'token_count'
+            (int, estimated tokens in the returned text)
         """
         # Rough approximation: 1 token ≈ 0.75 words, so max_words = max_tokens * 0.75
         max_words = int(max_tokens * 0.75)
-        words = text.split()
+        # First pass only counts words; no list of matches is kept
+        word_count = count_words(text)
 
-        if len(words) <= max_words:
-            return {'text': text, 'truncated': False}
+        if word_count <= max_words:
+            return {'text': text, 'truncated': False, 'token_count': int(word_count / 0.75)}
 
         # Take first 60% and last 40% to preserve context
         first_part_words = int(max_words * 0.6)
         last_part_words = int(max_words * 0.4)
 
+        # Second pass stops at the two boundary words; slice the original text there
+        matches = _WORD_RE.finditer(text)
+        head_end = next(islice(matches, first_part_words - 1, None)).end() if first_part_words else 0
+        tail_skip = word_count - last_part_words - first_part_words
+        tail_start = next(islice(matches, tail_skip, None)).start() if last_part_words else len(text)
+
         truncated_text = (
-            ' '.join(words[:first_part_words]) +
+            text[:head_end] +
             '\n\n[... content truncated ...]\n\n' +
-            ' '.join(words[-last_part_words:])
+            text[tail_start:]
         )
 
-        return {'text': truncated_text, 'truncated': True}
+        return {
+            'text': truncated_text,
+            'truncated': True,
+            'token_count': int((first_part_words + last_part_words) / 0.75)
+        }